@@ -1,16 +1,174 @@
 import sys
-import zlib
+from binascii import unhexlify
 import hashlib
 from pathlib import Path
-from typing import List
+from typing import Iterable, Iterator, List, TextIO
+from functools import lru_cache, partial
+from itertools import chain
+from operator import itemgetter
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 import shutil
 import os
 import fnmatch
+import re
+import threading
+
+# zlib-ng is a faster drop-in implementation of the same deflate format, so
+# objects stay readable by the stdlib module (and by Git).
+try:
+    from zlib_ng import zlib_ng as zlib
+except ImportError:
+    import zlib
+
+# Loose objects are compressed at Z_BEST_SPEED, matching Git's default. Higher
+# levels cost several times the CPU for a few percent smaller objects.
+COMPRESSION_LEVEL = 1
+
+# Files are hashed and compressed in 256 KiB chunks, which keeps memory bounded
+# for large blobs while staying well above the point where syscall overhead dominates.
+CHUNK_SIZE = 1 << 18
+
+# Characters allowed in the hex object hashes recorded in the index
+HEX_DIGITS = b"0123456789abcdefABCDEF"
+
+# Objects below this size take the single-shot path in write_object
+SMALL_OBJECT_SIZE = 4096
+
+# Index entries from one `add` are buffered and written out together
+INDEX_BUFFER_SIZE = 1 << 20
+
+# Buffer size for file copies that cannot be done in the kernel
+COPY_BUFFER_SIZE = 1 << 20
+
+# Object files are written as 1 MiB iovec slices, at most 64 per writev call
+WRITE_CHUNK_SIZE = 1 << 20
+MAX_IOVECS = 64
+
+# Whether to fsync each object before renaming it into place. Off by default,
+# like Git's core.fsyncObjectFiles; the rename alone already hides partial writes.
+FSYNC_OBJECTS = False
+
+# Flags for files written with os.open: truncated, write-only, binary on Windows
+WRITE_FILE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+
+# Object fan-out directories already created by this process
+_object_dirs: set[str] = set()
+
+# LRU cache of decompressed commit and tree objects, keyed by (objects root, sha)
+OBJECT_CACHE_SIZE = 1024
+CACHED_OBJECT_TYPES = (b"commit", b"tree")
+_object_cache: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+_object_cache_lock = threading.Lock()
+
+def new_sha1(data: bytes = b""):
+    """
+    Creates a SHA-1 hash object for computing object IDs.
+
+    Args:
+        data (bytes): Initial data to feed into the hash.
+
+    Returns:
+        A hashlib-compatible SHA-1 object supporting `update()` and `hexdigest()`.
+    """
+    return hashlib.sha1(data, usedforsecurity=False)
+
+@lru_cache(maxsize=None)
+def objects_root(parent: Path) -> str:
+    """
+    Returns the object store directory of a repository as an absolute plain string.
+
+    Object paths are built from this with f-strings instead of `Path` joins,
+    which avoids allocating several `Path` objects for every object read or
+    written. The path is made absolute because it keys the module-level object
+    and directory caches, which must stay valid if the process changes its
+    working directory (as `clone` does). Results are memoised so the `abspath`
+    call is paid once per command; since a relative `parent` such as `Path(".")`
+    refers to a different repository after a `chdir`, the memo must be cleared
+    whenever the working directory changes.
+
+    Args:
+        parent (Path): The parent directory path where the repository is located.
+
+    Returns:
+        str: The absolute path of the `.scs/objects` directory.
+    """
+    return os.path.abspath(os.path.join(parent, ".scs", "objects"))
+
+def iter_object_chunks(objects_dir: str, sha: str) -> Iterator[bytes]:
+    """
+    Streams the decompressed header and content of an object from a .scs repository.
+
+    The object file is read and inflated in `CHUNK_SIZE` pieces, so large blobs can
+    be consumed without ever holding them in memory as a whole. The first item
+    yielded is the `<type> <size>` header (without its null terminator); callers
+    that only want the content skip it with `next()`.
+
+    Args:
+        objects_dir (str): The repository's object store, as returned by `objects_root`.
+        sha (str): The SHA hash of the object to retrieve.
+
+    Yields:
+        bytes: The object header, then consecutive, non-empty pieces of its content.
+
+    Raises:
+        FileNotFoundError: If the object file does not exist at the calculated path.
+        zlib.error: If there is an error during decompression, or the object file
+                    is truncated or has trailing data.
+        ValueError: If the decompressed data has no header terminator.
+    """
+    # Construct the file path to the object using the object store and SHA hash
+    p = f"{objects_dir}/{sha[:2]}/{sha[2:]}"
+
+    decompressor = zlib.decompressobj()
+    header = bytearray()
+    with open(p, "rb", buffering=0) as f:
+        for compressed in iter(partial(f.read, CHUNK_SIZE), b""):
+            while compressed:
+                # Cap each output piece so highly compressible data cannot balloon in memory
+                data = decompressor.decompress(compressed, CHUNK_SIZE)
+                compressed = decompressor.unconsumed_tail
+
+                if header is not None:
+                    # The header may straddle chunk boundaries; buffer until the null byte
+                    header += data
+                    end = header.find(b"\0")
+                    if end < 0:
+                        continue
+                    yield bytes(header[:end])
+                    data = bytes(header[end + 1:])
+                    header = None
+
+                if data:
+                    yield data
+
+    data = decompressor.flush()
+
+    # A truncated file ends before the zlib stream does; trailing bytes mean corruption
+    if not decompressor.eof:
+        raise zlib.error(f"Incomplete or truncated object: {sha}")
+    if decompressor.unused_data:
+        raise zlib.error(f"Trailing data after object: {sha}")
+
+    if header is not None:
+        header += data
+        end = header.find(b"\0")
+        if end < 0:
+            raise ValueError(f"Invalid object: {sha}")
+        yield bytes(header[:end])
+        data = bytes(header[end + 1:])
+    if data:
+        yield data
 
 def read_object(parent: Path, sha: str) -> bytes:
     """
     Reads and decompresses an object from a .scs repository based on its SHA hash.
 
+    Commit and tree objects are kept in a small LRU cache, since commands such as
+    `log` and `checkout` read the same ones repeatedly. Objects are immutable and
+    content-addressed, so cached entries never go stale. Blobs are not cached to
+    keep large file contents out of memory.
+
     Args:
         parent (Path): The parent directory path where the repository is located.
         sha (str): The SHA hash of the object to retrieve. The first two characters of the
@@ -23,22 +181,104 @@ def read_object(parent: Path, sha: str) -> bytes:
     Raises:
         FileNotFoundError: If the object file does not exist at the calculated path.
         zlib.error: If there is an error during decompression.
+        ValueError: If the decompressed data has no header terminator.
     """
-    # Split the SHA hash into its 'pre' (first two characters) and 'post' (remaining characters)
-    pre = sha[:2]
-    post = sha[2:]
+    objects_dir = objects_root(parent)
+    key = (objects_dir, sha)
+    with _object_cache_lock:
+        content = _object_cache.get(key)
+        if content is not None:
+            _object_cache.move_to_end(key)
+            return content
+
+    chunks = iter_object_chunks(objects_dir, sha)
+    ty = next(chunks).split(b" ", 1)[0]
+    content = b"".join(chunks)
+
+    if ty in CACHED_OBJECT_TYPES:
+        with _object_cache_lock:
+            _object_cache[key] = content
+            if len(_object_cache) > OBJECT_CACHE_SIZE:
+                _object_cache.popitem(last=False)
 
-    # Construct the file path to the object using the parent directory and SHA hash
-    p = parent / ".scs" / "objects" / pre / post
+    return content
 
-    # Read the raw bytes from the object file
-    bs = p.read_bytes()
+def write_all(fd: int, data: bytes) -> None:
+    """
+    Writes a buffer to a file descriptor with vectored writes.
 
-    # Decompress the bytes and split on the first null byte to separate the header and content
-    _, content = zlib.decompress(bs).split(b"\0", maxsplit=1)
+    The buffer is split into `WRITE_CHUNK_SIZE` memoryview slices (no copies) and
+    handed to `os.writev`, retrying until everything is written since the kernel
+    may accept only part of the request. Platforms without `writev` fall back to
+    `os.write` per slice.
 
-    # Return the decompressed content
-    return content
+    Args:
+        fd (int): An open file descriptor.
+        data (bytes): The bytes to write.
+    """
+    view = memoryview(data)
+    while view:
+        slices = [view[i:i + WRITE_CHUNK_SIZE] for i in range(0, len(view), WRITE_CHUNK_SIZE)]
+        if hasattr(os, "writev"):
+            written = os.writev(fd, slices[:MAX_IOVECS])
+        else:
+            written = os.write(fd, slices[0])
+        view = view[written:]
+
+def store_object(objects_dir: str, compressed: Iterable[bytes], hasher) -> str:
+    """
+    Writes compressed object data to the object store and returns the object's hash.
+
+    The data is written to a temporary file in `.scs/objects`, optionally fsynced
+    (see `FSYNC_OBJECTS`) and then renamed to its final path, so readers never
+    see a partially written object. `compressed` is fully consumed before the
+    hash is read, which lets a generator feed `hasher` as it produces data.
+
+    Args:
+        objects_dir (str): The repository's object store, as returned by `objects_root`.
+        compressed (Iterable[bytes]): The zlib-compressed object, in order.
+        hasher: The SHA-1 hash object for the uncompressed object.
+
+    Returns:
+        str: The SHA-1 hash of the object.
+
+    Raises:
+        SystemExit: If `objects_dir` does not exist, i.e. outside an scs repository.
+        OSError: If there is an error creating directories or writing the object file.
+    """
+    # The temporary name only has to be unique among concurrent writers
+    tmp_path = f"{objects_dir}/tmp_obj_{os.getpid()}_{threading.get_ident()}"
+    try:
+        fd = os.open(tmp_path, WRITE_FILE_FLAGS, 0o644)
+    except FileNotFoundError:
+        # The object store is created by `init` and never implicitly
+        if not os.path.isdir(objects_dir):
+            print(f"Error: Not an scs repository (missing {objects_dir}). Run `init` first.")
+            sys.exit(1)
+        raise
+    try:
+        try:
+            for data in compressed:
+                write_all(fd, data)
+            if FSYNC_OBJECTS:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        hash = hasher.hexdigest()
+
+        # Create the two-character fan-out directory once per process
+        object_dir = f"{objects_dir}/{hash[:2]}"
+        if object_dir not in _object_dirs:
+            os.makedirs(object_dir, exist_ok=True)
+            _object_dirs.add(object_dir)
+
+        os.replace(tmp_path, f"{object_dir}/{hash[2:]}")
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    return hash
 
 def write_object(parent: Path, ty: str, content: bytes) -> str:
     """
@@ -59,42 +299,135 @@ def write_object(parent: Path, ty: str, content: bytes) -> str:
     Raises:
         OSError: If there is an error creating directories or writing the object file.
     """
-    # Prepare the content by adding type, length, and a null byte separator
-    content = ty.encode() + b" " + f"{len(content)}".encode() + b"\0" + content
+    # Prepare the header from the type, length, and a null byte separator
+    header = f"{ty} {len(content)}\0".encode()
+
+    # Small objects (trees, commits, small blobs) are joined with their header so they
+    # are hashed and compressed in one call each. Larger content is fed separately so
+    # it is never copied behind the header.
+    small = len(content) < SMALL_OBJECT_SIZE
+    if small:
+        data = header + content
+        hasher = new_sha1(data)
+    else:
+        hasher = new_sha1(header)
+        hasher.update(content)
+
+    # Objects are content-addressed, so an existing file already holds this content
+    hash = hasher.hexdigest()
+    objects_dir = objects_root(parent)
+    if os.path.exists(f"{objects_dir}/{hash[:2]}/{hash[2:]}"):
+        return hash
+
+    if small:
+        # Size the deflate window to the object plus deflate's 262-byte lookahead, which
+        # skips most of the setup cost of a full 32 KiB window for objects this small.
+        # The deflate stream is identical; only the zlib header's CMF byte (and the FLG
+        # check bits) differ, recording the smaller window. Any zlib reader accepts it.
+        window_bits = max(9, (len(data) + 261).bit_length())
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, window_bits)
+        compressed_chunks = [compressor.compress(data), compressor.flush()]
+    else:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL)
+        compressed_chunks = [compressor.compress(header), compressor.compress(content), compressor.flush()]
+
+    # Write the compressed content to the path derived from the hash
+    return store_object(objects_dir, compressed_chunks, hasher)
+
+def write_object_stream(parent: Path, ty: str, size: int, chunks: Iterable[bytes]) -> str:
+    """
+    Writes an object to a .scs repository from a stream of chunks and returns its SHA-1 hash.
 
-    # Calculate the SHA-1 hash of the content
-    hash = hashlib.sha1(content, usedforsecurity=False).hexdigest()
+    Unlike `write_object`, the content is never held in memory as a whole: each chunk
+    is fed to the hash and the compressor as it arrives and the compressed output is
+    written out immediately by `store_object`.
 
-    # Compress the content using zlib
-    compressed_content = zlib.compress(content)
+    Args:
+        parent (Path): The parent directory path where the repository is located.
+        ty (str): The type of the object being stored (e.g., "blob").
+        size (int): The total length of the content, needed up front for the header.
+        chunks (Iterable[bytes]): The content of the object, in order.
 
-    # Determine the directory structure using the first two characters of the hash
-    pre = hash[:2]
-    post = hash[2:]
+    Returns:
+        str: The SHA-1 hash of the object, used to uniquely identify it in the repository.
 
-    # Construct the file path for storing the compressed object
-    p = parent / ".scs" / "objects" / pre / post
+    Raises:
+        ValueError: If the chunks do not add up to `size` bytes.
+        OSError: If there is an error creating directories or writing the object file.
+    """
+    header = f"{ty} {size}\0".encode()
+    hasher = new_sha1(header)
+    compressor = zlib.compressobj(COMPRESSION_LEVEL)
 
-    # Ensure the target directory exists
-    p.parent.mkdir(parents=True, exist_ok=True)
+    def compressed_chunks() -> Iterator[bytes]:
+        written = 0
+        yield compressor.compress(header)
+        for chunk in chunks:
+            written += len(chunk)
+            hasher.update(chunk)
+            yield compressor.compress(chunk)
+        yield compressor.flush()
 
-    # Write the compressed content to the calculated path
-    p.write_bytes(compressed_content)
+        if written != size:
+            raise ValueError(f"Expected {size} bytes of {ty} content, got {written}")
 
-    # Return the SHA-1 hash of the object
-    return hash
+    return store_object(objects_root(parent), compressed_chunks(), hasher)
 
-def parse_ignore_file() -> list[str]:
+def write_file_object(parent: Path, path: Path) -> str:
     """
-    Parses the .scsignore file to extract patterns for ignoring files.
+    Stores a file as a blob object, streaming it from disk in `CHUNK_SIZE` pieces.
+
+    Args:
+        parent (Path): The parent directory path where the repository is located.
+        path (Path): The file whose content should be stored.
+
+    Returns:
+        str: The SHA-1 hash of the blob object.
+    """
+    size = path.stat().st_size
+    with path.open("rb", buffering=0) as f:
+        return write_object_stream(parent, "blob", size, iter(partial(f.read, CHUNK_SIZE), b""))
+
+# Compiled .scsignore matcher, keyed by the file's (mtime, size) so the globs are
+# only translated again when the file changes
+_ignore_cache: dict[tuple[int, int], re.Pattern] = {}
+
+def compile_ignore_patterns(patterns: list[str]) -> re.Pattern:
+    """
+    Compiles a list of glob patterns into a single regular expression.
+
+    Each pattern is translated with `fnmatch.translate` and the results are joined
+    into one alternation, so a path is checked against every pattern in a single
+    `match` call.
+
+    Args:
+        patterns (list[str]): The glob patterns to compile.
+
+    Returns:
+        re.Pattern: A compiled expression matching any of the patterns. If the list
+                    is empty, the expression never matches.
+
+    Example:
+        ```
+        compile_ignore_patterns(['*.log']).match('error.log')  # matches
+        ```
+    """
+    if not patterns:
+        return re.compile(r"(?!)")
+    return re.compile("|".join(f"(?:{fnmatch.translate(os.path.normcase(p))})" for p in patterns))
+
+def parse_ignore_file() -> re.Pattern:
+    """
+    Parses the .scsignore file and compiles its patterns for ignoring files.
 
     This function reads the contents of the .scsignore file, which contains patterns
-    for files or directories to be ignored. It filters out comments and empty lines,
-    returning a list of the valid patterns.
+    for files or directories to be ignored. It filters out comments and empty lines
+    and compiles the valid patterns with `compile_ignore_patterns`. The compiled
+    result is cached until the file's modification time or size changes.
 
     Returns:
-        list[str]: A list of patterns (as strings) to ignore. If the .scsignore file
-                   doesn't exist, an empty list is returned.
+        re.Pattern: A compiled expression matching any of the ignore patterns. If the
+                    .scsignore file doesn't exist, the expression never matches.
 
     Example:
         If the .scsignore file contains the following:
@@ -105,102 +438,144 @@ def parse_ignore_file() -> list[str]:
         # Ignore temp directories
         temp/
         ```
-        The function will return: ['*.log', 'temp/']
+        The function will return the compiled form of ['*.log', 'temp/'].
     """
     # Path to the ignore file
     ignore_file = Path(".scsignore")
 
-    # Return an empty list if the ignore file does not exist
-    if not ignore_file.exists():
-        return []
+    # Nothing is ignored if the ignore file does not exist
+    try:
+        stat = ignore_file.stat()
+    except FileNotFoundError:
+        return compile_ignore_patterns([])
 
-    # Read the file and extract non-empty, non-comment lines
-    with ignore_file.open() as f:
-        patterns = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    key = (stat.st_mtime_ns, stat.st_size)
+    compiled = _ignore_cache.get(key)
+    if compiled is None:
+        # Read the file and extract non-empty, non-comment lines
+        with ignore_file.open() as f:
+            patterns = [line.strip() for line in f if line.strip() and not line.startswith("#")]
 
-    return patterns
+        compiled = compile_ignore_patterns(patterns)
+        _ignore_cache.clear()
+        _ignore_cache[key] = compiled
 
-def is_ignored(file_path: Path, ignore_patterns: list[str]) -> bool:
+    return compiled
+
+def is_ignored(file_path: Path, ignore_patterns: re.Pattern) -> bool:
     """
-    Checks if a file should be ignored based on the provided ignore patterns.
+    Checks if a file should be ignored based on the compiled ignore patterns.
 
-    This function compares the given file path against a list of ignore patterns
-    (e.g., file extensions or directory names) to determine if the file matches
-    any of the patterns. If a match is found, the function returns `True`,
-    indicating the file should be ignored.
+    This function matches the given file path against the expression returned by
+    `parse_ignore_file` (e.g., file extensions or directory names). If it matches,
+    the function returns `True`, indicating the file should be ignored.
 
     Args:
         file_path (Path): The file path to check.
-        ignore_patterns (list[str]): A list of patterns to match against the file path.
+        ignore_patterns (re.Pattern): The compiled ignore patterns.
 
     Returns:
         bool: `True` if the file matches any of the ignore patterns, otherwise `False`.
 
     Example:
-        If the ignore patterns are ['*.log', 'temp/'] and the file path is 'temp/data.txt',
-        the function will return `True` since the file path matches the 'temp/' pattern.
+        If the ignore patterns are ['*.log', 'temp/*'] and the file path is 'temp/data.txt',
+        the function will return `True` since the file path matches the 'temp/*' pattern.
 
         Similarly, if the file path is 'error.log', the function will return `True` for
         the '*.log' pattern.
     """
-    for pattern in ignore_patterns:
-        # Check if the file path matches the current pattern
-        if fnmatch.fnmatch(str(file_path), pattern):
-            return True
-    return False
+    return ignore_patterns.match(os.path.normcase(str(file_path))) is not None
 
-def stage_file(parent: Path, path: Path) -> None:
+def write_objects_batch(parent: Path, paths: list[Path]) -> list[str]:
     """
-    Stages a file for version control by adding it to an index file and
-    compressing its content into a blob object.
+    Stores several files as blob objects in one call.
 
-    This function checks if the file exists, if it should be ignored based
-    on patterns in the `.scsignore` file, and if not, stages it by:
-    1. Writing the file content to a blob object.
-    2. Adding the blob object hash and file metadata to an index file.
+    Staging many files hashes and stores each blob independently, so the files
+    are spread over a thread pool. hashlib, zlib and file I/O all release the
+    GIL, so compressing one file overlaps with reading and writing others. Each
+    file is streamed from disk, so memory use does not grow with the size of
+    the batch.
 
     Args:
-        parent (Path): The root directory of the repository.
-        path (Path): The path of the file to be staged.
+        parent (Path): The parent directory path where the repository is located.
+        paths (list[Path]): The files to store, in order.
 
     Returns:
-        None: This function does not return any value.
+        list[str]: The SHA-1 hash of each blob, in the same order as `paths`.
+    """
+    workers = os.cpu_count() or 1
+    if workers < 2 or len(paths) < 2:
+        return [write_file_object(parent, path) for path in paths]
 
-    Example:
-        If the file exists and is not ignored, this function will create a
-        corresponding entry in the index file and print a message indicating
-        the file was staged.
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # map() yields results in submission order, keeping the index deterministic
+        return list(executor.map(partial(write_file_object, parent), paths))
 
-        If the file is ignored or does not exist, it will print an appropriate
-        message and not stage the file.
+def should_stage(parent: Path, path: Path, ignore_patterns: re.Pattern) -> bool:
+    """
+    Checks whether a path can be staged.
 
-    Notes:
-        - The file is staged as a "blob" with mode `100644` (regular file).
-        - The `.scsignore` file is parsed for ignore patterns to decide if the
-          file should be ignored.
+    A path is skipped if it does not exist or if it matches one of the patterns
+    in the `.scsignore` file. A message is printed for each skipped path.
+
+    Args:
+        parent (Path): The root directory of the repository.
+        path (Path): The path of the file to check.
+        ignore_patterns (re.Pattern): The compiled patterns from `parse_ignore_file`,
+                                      parsed once per command rather than per path.
+
+    Returns:
+        bool: `True` if the file exists and is not ignored, otherwise `False`.
     """
     # Check if the file exists
     if not path.exists():
         print(f"File {path} does not exist")
-        return
+        return False
 
-    # Parse .scsignore patterns
-    ignore_patterns = parse_ignore_file()
     relative_path = str(path.relative_to(parent))
 
     # Check if the file should be ignored
     if is_ignored(Path(relative_path), ignore_patterns):
         print(f"Ignoring {relative_path}")
-        return
+        return False
 
-    # Write the blob object and get its hash
-    file_hash = write_object(parent, "blob", path.read_bytes())
+    return True
+
+def stage_file(parent: Path, path: Path, file_hash: str, index: TextIO) -> None:
+    """
+    Stages a file for version control by adding its blob to the index file.
+
+    The blob object must already have been written (see `write_objects_batch`),
+    so this function only records the hash and file metadata in the index. The
+    index is passed in as an open file so a whole batch of files is staged with
+    a single open/close of `.scs/index`.
+
+    Args:
+        parent (Path): The root directory of the repository.
+        path (Path): The path of the file to be staged.
+        file_hash (str): The hash of the blob object holding the file content.
+        index (TextIO): The `.scs/index` file, opened for appending.
+
+    Returns:
+        None: This function does not return any value.
+
+    Example:
+        Staging a file after writing its blob:
+        ```
+        [file_hash] = write_objects_batch(parent, [path])
+        with (parent / ".scs" / "index").open("a") as index:
+            stage_file(parent, path, file_hash, index)
+        ```
+
+    Notes:
+        - The file is staged as a "blob" with mode `100644` (regular file).
+        - Use `should_stage` beforehand to skip missing or ignored files.
+    """
+    relative_path = str(path.relative_to(parent))
     mode = "100644"  # Regular file
 
     # Write to the index file
-    index_path = parent / ".scs" / "index"
-    with index_path.open("a") as index:
-        index.write(f"{mode} {relative_path} {file_hash}\n")
+    index.write(f"{mode} {relative_path} {file_hash}\n")
 
     print(f"Staged {relative_path}")
 
@@ -230,6 +605,9 @@ def build_tree_from_index(parent: Path) -> str:
         The function will create a tree object representing the directory structure
         and return its hash.
 
+    Raises:
+        ValueError: If an index line is not `<mode> <path> <40-character hash>`.
+
     Notes:
         - The `.scs/index` file must exist and contain at least one entry to
           generate a tree object.
@@ -245,20 +623,30 @@ def build_tree_from_index(parent: Path) -> str:
         print("Index file is empty or does not exist.")
         return ""
 
-    # Read and parse the index file
-    with index_path.open("r") as index:
-        for line in index:
-            mode, relative_path, file_hash = line.strip().split(" ")
+    # Read and parse the index file as raw bytes in one read. The mode is everything
+    # before the first space and the hash everything after the last, so paths are never
+    # decoded; partition/rpartition split each line in C without index arithmetic.
+    for line in index_path.read_bytes().splitlines():
+        if line:
+            mode, mode_sep, rest = line.partition(b" ")
+            relative_path, hash_sep, file_hash = rest.rpartition(b" ")
+            if (
+                not (mode_sep and hash_sep and relative_path)
+                or len(file_hash) != 40
+                or file_hash.strip(HEX_DIGITS)
+            ):
+                raise ValueError(f"Invalid index entry: {line!r}")
             entries.append((mode, relative_path, file_hash))
 
     # Sort the entries by file path
-    entries.sort(key=lambda x: x[1])  # Sort by file path
+    entries.sort(key=itemgetter(1))  # Sort by file path
 
-    # Build the tree content by combining file entries
-    tree_content = b"".join(
-        f"{mode} {path}\0".encode() + bytes.fromhex(hash)
+    # Build the tree content by combining file entries. A single %-format per entry
+    # replaces a chain of concatenations.
+    tree_content = b"".join([
+        b"%b %b\0%b" % (mode, path, unhexlify(hash))
         for mode, path, hash in entries
-    )
+    ])
 
     # Write the tree object and return its hash
     return write_object(parent, "tree", tree_content)
@@ -410,32 +798,40 @@ def reconcile_trees(base: str, current: str, target: str) -> str:
     current_lines = current.splitlines()
     target_lines = target.splitlines()
 
-    merged_lines = []
+    # Frozensets give O(1) membership checks instead of scanning each list per line
+    base_set = frozenset(base_lines)
+    current_set = frozenset(current_lines)
+    target_set = frozenset(target_lines)
 
-    for line in set(base_lines + current_lines + target_lines):
-        if line in current_lines and line in target_lines:
-            merged_lines.append(line)  # No conflict; identical in both branches
-        elif line in base_lines:
-            if line in current_lines and line not in target_lines:
+    merged_lines = []
+    append = merged_lines.append
+
+    # dict.fromkeys de-duplicates like a set but keeps lines in their original order;
+    # chain() feeds it all three lists without building a concatenated copy first
+    for line in dict.fromkeys(chain(base_lines, current_lines, target_lines)):
+        if line in current_set and line in target_set:
+            append(line)  # No conflict; identical in both branches
+        elif line in base_set:
+            if line in current_set and line not in target_set:
                 # Modified in current branch only
-                merged_lines.append(line)
-            elif line in target_lines and line not in current_lines:
+                append(line)
+            elif line in target_set and line not in current_set:
                 # Modified in target branch only
-                merged_lines.append(line)
+                append(line)
             else:
                 # Modified in both branches; this is a conflict
-                merged_lines.append(f"<<<<<<< Current Branch\n{line}\n=======\n{line}\n>>>>>>> Target Branch")
+                append(f"<<<<<<< Current Branch\n{line}\n=======\n{line}\n>>>>>>> Target Branch")
         else:
             # Line added in one branch
-            if line in current_lines:
-                merged_lines.append(line)
-            elif line in target_lines:
-                merged_lines.append(line)
+            if line in current_set:
+                append(line)
+            elif line in target_set:
+                append(line)
 
     return "\n".join(merged_lines)
 
 
-def read_commit_tree(commit_hash: str) -> str:
+def read_commit_tree(parent: Path, commit_hash: str) -> str:
     """
     Reads the tree hash from a commit object.
 
@@ -444,6 +840,7 @@ def read_commit_tree(commit_hash: str) -> str:
     is returned as a string.
 
     Args:
+        parent (Path): The root directory of the repository.
         commit_hash (str): The hash of the commit from which to read the tree hash.
 
     Returns:
@@ -452,7 +849,7 @@ def read_commit_tree(commit_hash: str) -> str:
     Example:
         Calling this function will return the tree hash of the specified commit:
         ```
-        tree_hash = read_commit_tree("abc123def4567890")
+        tree_hash = read_commit_tree(Path("/path/to/repo"), "abc123def4567890")
         ```
 
     Raises:
@@ -462,47 +859,145 @@ def read_commit_tree(commit_hash: str) -> str:
         - The function assumes that the commit object exists and is correctly formatted.
         - The tree hash is expected to be on a line starting with "tree ".
     """
-    commit_data = read_object(commit_hash, "commit")
+    commit_data = read_object(parent, commit_hash).decode()
     for line in commit_data.splitlines():
         if line.startswith("tree "):
             return line.split()[1]
     raise ValueError(f"Invalid commit object: {commit_hash}")
 
 
-def checkout_tree(tree_hash: str):
+def iter_tree_entries(tree_content: bytes) -> Iterator[tuple[bytes, str, str]]:
     """
-    Recursively checks out the contents of a tree object into the working directory.
+    Parses the entries of a binary tree object.
 
-    This function takes a tree object hash, reads the tree's contents, and recreates the directory
-    structure and files in the working directory. Directories are created recursively, and files
-    are written with the content from the corresponding blob object.
+    Each entry is `<mode> <name>\\0` followed by the 20-byte object hash, so the
+    content is walked by offset rather than split into lines.
 
     Args:
+        tree_content (bytes): The decompressed content of a tree object.
+
+    Yields:
+        tuple[bytes, str, str]: The mode, name and hex hash of each entry.
+    """
+    pos = 0
+    while pos < len(tree_content):
+        mode_end = tree_content.index(b" ", pos)
+        name_end = tree_content.index(b"\0", mode_end)
+        yield (
+            tree_content[pos:mode_end],
+            tree_content[mode_end + 1:name_end].decode(),
+            tree_content[name_end + 1:name_end + 21].hex(),
+        )
+        pos = name_end + 21
+
+def checkout_tree(parent: Path, tree_hash: str, prefix: str = "."):
+    """
+    Checks out the contents of a tree object, and any subtrees, into the working directory.
+
+    The tree is walked breadth-first without recursion. The first pass only reads
+    tree objects, collecting every directory and file to create; the directories
+    are then created once each, and finally every blob is streamed from the object
+    store straight into its file, so large files are never held in memory.
+
+    Args:
+        parent (Path): The root directory of the repository.
         tree_hash (str): The hash of the tree object to checkout.
+        prefix (str): The directory to check the tree out into.
 
     Example:
         Calling this function will recreate the working directory state from a specific tree:
         ```
-        checkout_tree("abc123def4567890")
+        checkout_tree(Path("."), "abc123def4567890")
         ```
 
     Notes:
         - The function assumes that the tree object and associated blob objects exist.
-        - Directories are created with `mkdir(parents=True, exist_ok=True)` to ensure that parent directories are created if needed.
-        - If the tree contains files, their content is fetched from the corresponding blob hash and written to disk.
-    """
-    tree_content = read_object(tree_hash, "tree").decode()
-    for line in tree_content.splitlines():
-        mode, name, obj_hash = line.split()
-        if mode == "40000":  # Directory
-            Path(name).mkdir(parents=True, exist_ok=True)
-            checkout_tree(obj_hash)
-        else:  # File
-            file_content = read_object(obj_hash, "blob")
-            Path(name).write_bytes(file_content)
+        - Entries of subtrees are checked out under the subtree's name.
+        - Existing files are overwritten with the content from the corresponding blob hash.
+    """
+    dirs: set[str] = set()
+    files: list[tuple[str, str]] = []
+
+    # Walk all trees first so each directory is created only once
+    pending = deque([(prefix, tree_hash)])
+    while pending:
+        tree_prefix, current_hash = pending.popleft()
+        for mode, name, obj_hash in iter_tree_entries(read_object(parent, current_hash)):
+            path = os.path.join(tree_prefix, name)
+            if mode == b"40000":  # Directory
+                dirs.add(path)
+                pending.append((path, obj_hash))
+            else:  # File; index paths may include directories
+                dirs.add(os.path.dirname(path))
+                files.append((path, obj_hash))
+
+    for directory in dirs:
+        os.makedirs(directory, exist_ok=True)
+
+    objects_dir = objects_root(parent)
+    for path, blob_hash in files:
+        chunks = iter_object_chunks(objects_dir, blob_hash)
+        next(chunks)  # Skip the header
+        fd = os.open(path, WRITE_FILE_FLAGS, 0o644)
+        try:
+            for chunk in chunks:
+                write_all(fd, chunk)
+        finally:
+            os.close(fd)
+
     print("Working directory recreated from tree.")
 
 
+def copy_file(src: str, dst: str) -> None:
+    """
+    Copies a file's content, letting the kernel move the data where possible.
+
+    On Linux, `os.copy_file_range` copies inside the kernel (or shares extents
+    on filesystems that support it) without passing the data through Python.
+    Elsewhere, or if the kernel refuses (e.g. across filesystems), the rest of
+    the file is copied with `shutil.copyfileobj` using a `COPY_BUFFER_SIZE` buffer.
+
+    Args:
+        src (str): The file to copy.
+        dst (str): The destination path; it is created or truncated.
+    """
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        if hasattr(os, "copy_file_range"):
+            remaining = os.fstat(s.fileno()).st_size
+            try:
+                while remaining > 0:
+                    copied = os.copy_file_range(s.fileno(), d.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+                return
+            except OSError:
+                # Both file offsets have advanced past what was copied, so the
+                # fallback below picks up where the kernel stopped
+                pass
+        shutil.copyfileobj(s, d, COPY_BUFFER_SIZE)
+
+def copy_tree(src: Path, dst: Path) -> None:
+    """
+    Recursively copies a directory, such as a repository's `.scs` folder.
+
+    The tree is walked once to create every destination directory, after which
+    the files are copied on a thread pool with `copy_file`; the kernel-side copy
+    releases the GIL, so many small object files are copied concurrently.
+
+    Args:
+        src (Path): The directory to copy.
+        dst (Path): The destination directory; it is created if needed.
+    """
+    files = []
+    for root, _, names in os.walk(src):
+        target_root = os.path.join(dst, os.path.relpath(root, src))
+        os.makedirs(target_root, exist_ok=True)
+        files.extend((os.path.join(root, name), os.path.join(target_root, name)) for name in names)
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        # list() re-raises the first copy error, if any
+        list(executor.map(lambda pair: copy_file(*pair), files))
 
 def main():
     if len(sys.argv) < 2:
@@ -529,24 +1024,28 @@ def main():
             (Path(".scs") / "index").touch()
             print("Initialized scs directory")
         case ["cat-file", "-p", blob_sha]:
-            sys.stdout.buffer.write(read_object(Path("."), blob_sha))
+            # Write the content as it is inflated rather than materializing the whole object
+            chunks = iter_object_chunks(objects_root(Path(".")), blob_sha)
+            next(chunks)  # Skip the header
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
         case ["hash-object", "-w", path]:
-            hash = write_object(Path("."), "blob", Path(path).read_bytes())
+            hash = write_file_object(Path("."), Path(path))
             print(hash)
         case ["add", *paths]:
-            for path in paths:
-                stage_file(Path("."), Path(path))
+            parent = Path(".")
+            ignore_patterns = parse_ignore_file()
+            staged = [path for path in map(Path, paths) if should_stage(parent, path, ignore_patterns)]
+            file_hashes = write_objects_batch(parent, staged)
+
+            # Open the index once for the whole batch; entries are flushed on close
+            index_path = parent / ".scs" / "index"
+            with index_path.open("a", buffering=INDEX_BUFFER_SIZE) as index:
+                for path, file_hash in zip(staged, file_hashes):
+                    stage_file(parent, path, file_hash, index)
             print(f"Staged files: {', '.join(paths)}")
         case ["ls-tree", "--name-only", tree_sha]:
-            items = []
-            contents = read_object(Path("."), tree_sha)
-            while contents:
-                mode, contents = contents.split(b" ", 1)
-                name, contents = contents.split(b"\0", 1)
-                sha = contents[:20]
-                contents = contents[20:]
-                items.append((mode.decode(), name.decode(), sha.hex()))
-            for _, name, _ in items:
+            for _, name, _ in iter_tree_entries(read_object(Path("."), tree_sha)):
                 print(name)
         case ["write-tree"]:
             parent = Path(".")
@@ -712,26 +1211,21 @@ def main():
 
             # Create target directory and initialize as repository
             target.mkdir(parents=True, exist_ok=False)
-            (target / ".scs").mkdir()
 
             # Copy all contents of the `.scs` folder
-            source_scs = source / ".scs"
-            target_scs = target / ".scs"
-
-            for item in source_scs.iterdir():
-                if item.is_dir():
-                    shutil.copytree(item, target_scs / item.name)
-                else:
-                    shutil.copy2(item, target_scs / item.name)
+            copy_tree(source / ".scs", target / ".scs")
 
             print(f"Cloned repository from {source_path} to {target_path}.")
 
             # Checkout the HEAD commit to create the working directory
             os.chdir(target)
-            head_commit_hash = (target / ".scs/HEAD").read_text().strip()
-            tree_hash = read_commit_tree(head_commit_hash)
-            checkout_tree(tree_hash)
-            print(f"Checked out the HEAD commit in {target_path}.")
+            objects_root.cache_clear()  # Relative parents now resolve to the clone
+            parent = Path(".")
+            head_commit_hash = get_current_branch_head(parent).read_text().strip()
+            if head_commit_hash:
+                tree_hash = read_commit_tree(parent, head_commit_hash)
+                checkout_tree(parent, tree_hash)
+                print(f"Checked out the HEAD commit in {target_path}.")
 
         case _:
             print("Unknown command")